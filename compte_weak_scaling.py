@@ -52,9 +52,22 @@ import os
 import numpy as np
 import argparse
 import re
-from datetime import datetime, timedelta
+import math
+import mmap
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 
+# (optional) JIT compilation of the step line search
+try:
+    from numba import njit
+    numba_available = True
+except ImportError:
+    numba_available = False
+    def njit(*args,**kwargs):
+        return lambda func: func
+
 ############################################################################################################
 # Command Line Arguments
 ############################################################################################################
@@ -71,11 +84,232 @@ args 		= vars(ap.parse_args())
 ############################################################################################################
 
 seconds_per_hour = 3600
+epoch_ordinal    = date(1970,1,1).toordinal()
+min_chunk_bytes  = 2**26 # smallest chunk of a log file that is scanned by its own process
+
+# compiled regular expressions (compiled once, rather than per line of the log file).
+# The log file is read as bytes, so the patterns are bytes patterns. Plain substrings
+# (e.g., b"open:") are tested with `in`, which is much cheaper than a regex, and the
+# regexes below are only run on lines that pass such a substring test. The timestamped
+# lines start with the timestamp (after, e.g., " [ "), so those patterns are anchored
+# and used with .match, which fails straight away on any other line.
+_WALLTIME_RE    = re.compile(rb"\W*(\d+-\d+-\d+)\s+(\d+:\d+:\d+\.\d+)")
+_STEP_LINE_RE   = re.compile(rb"\W*(\d+-\d+-\d+)\s+(\d+:\d+:\d+\.\d+).*?\bn=\d+.*?\bdt=([\d.eE+-]+)")
+_CORES_RE       = re.compile(rb"Number of MPI tasks:\s*(\d+)")
+_NX_RE          = re.compile(rb"Number x zones:\s*(\d+)")
+_NY_RE          = re.compile(rb"Number y zones:\s*(\d+)")
+_NZ_RE          = re.compile(rb"Number z zones:\s*(\d+)")
+
+# byte values used by the JIT compiled step line search
+_NEWLINE        = ord("\n")
+_DASH           = ord("-")
+_COLON          = ord(":")
+_DOT            = ord(".")
+_PLUS           = ord("+")
+_EQUALS         = ord("=")
+_ZERO           = ord("0")
+_NINE           = ord("9")
+_UPPER_A        = ord("A")
+_UPPER_E        = ord("E")
+_UPPER_Z        = ord("Z")
+_LOWER_A        = ord("a")
+_LOWER_D        = ord("d")
+_LOWER_E        = ord("e")
+_LOWER_N        = ord("n")
+_LOWER_T        = ord("t")
+_LOWER_Z        = ord("z")
+_UNDERSCORE     = ord("_")
+_SPACE          = ord(" ")
+_TAB            = ord("\t")
+_CARRIAGE_RETURN = ord("\r")
+
+############################################################################################################
+# Functions (JIT compiled with numba, if it is available)
+############################################################################################################
+
+@njit(cache=True)
+def _is_digit(byte):
+    return _ZERO <= byte <= _NINE
+
+@njit(cache=True)
+def _is_word(byte):
+    # the regex word characters, [a-zA-Z0-9_]
+    return (_is_digit(byte) or (_UPPER_A <= byte <= _UPPER_Z) or (_LOWER_A <= byte <= _LOWER_Z)
+            or byte == _UNDERSCORE)
+
+@njit(cache=True)
+def _is_space(byte):
+    # the regex whitespace characters, [ \t\n\r\f\v]
+    return byte == _SPACE or _TAB <= byte <= _CARRIAGE_RETURN
+
+@njit(cache=True)
+def _is_dt_char(byte):
+    # the characters of a dt value, [\d.eE+-]
+    return (_is_digit(byte) or byte == _DOT or byte == _LOWER_E or byte == _UPPER_E
+            or byte == _PLUS or byte == _DASH)
+
+@njit(cache=True)
+def _parse_int(buf,pos,end):
+    # parse the digits starting at pos, returning the value and the position after them
+    value = 0
+    while pos < end and _is_digit(buf[pos]):
+        value = value*10 + (buf[pos] - _ZERO)
+        pos += 1
+    return value, pos
+
+@njit(cache=True)
+def _days_from_civil(year,month,day):
+    # days since 1970-01-01 of a (proleptic Gregorian) date, without datetime
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era*400
+    if month > 2:
+        doy = (153*(month - 3) + 2)//5 + day - 1
+    else:
+        doy = (153*(month + 9) + 2)//5 + day - 1
+    doe = yoe*365 + yoe//4 - yoe//100 + doy
+    return era*146097 + doe - 719468
+
+@njit(cache=True)
+def _parse_timestamp(buf,pos,end):
+    # match a MM-DD-YYYY HH:MM:SS.fff timestamp at pos, returning whether it
+    # matched, the time in microseconds since the epoch and the position after it
+    month, p = _parse_int(buf,pos,end)
+    if p == pos or p >= end or buf[p] != _DASH:
+        return False, 0, pos
+    day, q = _parse_int(buf,p+1,end)
+    if q == p+1 or q >= end or buf[q] != _DASH:
+        return False, 0, pos
+    year, p = _parse_int(buf,q+1,end)
+    if p == q+1:
+        return False, 0, pos
+    q = p
+    while q < end and _is_space(buf[q]):
+        q += 1
+    if q == p:
+        return False, 0, pos
+    hours, p = _parse_int(buf,q,end)
+    if p == q or p >= end or buf[p] != _COLON:
+        return False, 0, pos
+    minutes, q = _parse_int(buf,p+1,end)
+    if q == p+1 or q >= end or buf[q] != _COLON:
+        return False, 0, pos
+    secs, p = _parse_int(buf,q+1,end)
+    if p == q+1 or p >= end or buf[p] != _DOT:
+        return False, 0, pos
+    # the fraction of a second, padded (or truncated) to microseconds
+    micro_secs = 0
+    n_frac = 0
+    q = p+1
+    while q < end and _is_digit(buf[q]):
+        if n_frac < 6:
+            micro_secs = micro_secs*10 + (buf[q] - _ZERO)
+            n_frac += 1
+        q += 1
+    if q == p+1:
+        return False, 0, pos
+    while n_frac < 6:
+        micro_secs *= 10
+        n_frac += 1
+    days = _days_from_civil(year,month,day)
+    return True, (((days*24 + hours)*60 + minutes)*60 + secs)*1000000 + micro_secs, q
+
+@njit(cache=True)
+def _parse_step_line(buf,start,end):
+    # the same match as _STEP_LINE_RE, i.e., a timestamp at the start of the line (after
+    # any non-word characters), followed by n=<step>, followed by dt=<dt>. Returns
+    # whether the line is a step and its time.
+    pos = start
+    while pos < end and not _is_word(buf[pos]):
+        pos += 1
+    matched, wall_time, pos = _parse_timestamp(buf,pos,end)
+    if not matched:
+        return False, 0
+    # n=<step>
+    matched = False
+    while pos + 2 < end:
+        if (buf[pos] == _LOWER_N and buf[pos+1] == _EQUALS and _is_digit(buf[pos+2])
+                and not _is_word(buf[pos-1])):
+            matched = True
+            pos += 2
+            break
+        pos += 1
+    if not matched:
+        return False, 0
+    # dt=<dt>
+    while pos + 3 < end:
+        if (buf[pos] == _LOWER_D and buf[pos+1] == _LOWER_T and buf[pos+2] == _EQUALS
+                and _is_dt_char(buf[pos+3]) and not _is_word(buf[pos-1])):
+            return True, wall_time
+        pos += 1
+    return False, 0
+
+@njit(cache=True)
+def scan_step_lines(buf):
+    # scan the raw bytes of a log file for the step lines, returning the (1-indexed)
+    # line numbers and wall times (microseconds) of the steps, and the number of lines
+    n_bytes = len(buf)
+    # the step arrays are grown by doubling their capacity when they are full
+    step_lines = np.empty(64,dtype=np.int64)
+    step_times = np.empty(64,dtype=np.int64)
+    n_steps = 0
+    line_number = 0
+    start = 0
+    while start < n_bytes:
+        end = start
+        while end < n_bytes and buf[end] != _NEWLINE:
+            end += 1
+        line_number += 1
+        # the same fixed column check as the line by line search (see deconstruct_log_file)
+        if end - start > 8 and buf[start+5] == _DASH and buf[start+8] == _DASH:
+            is_step, wall_time = _parse_step_line(buf,start,end)
+        else:
+            is_step = False
+        if is_step:
+            if n_steps == len(step_lines):
+                step_lines = np.concatenate((step_lines,np.empty(n_steps,dtype=np.int64)))
+                step_times = np.concatenate((step_times,np.empty(n_steps,dtype=np.int64)))
+            step_lines[n_steps] = line_number
+            step_times[n_steps] = wall_time
+            n_steps += 1
+        start = end + 1
+    return step_lines[:n_steps], step_times[:n_steps], line_number
+
+def scan_log_chunk(file,start,stop):
+    # map and scan a (line aligned) byte range of a log file, in a worker process
+    with open(file,"rb") as fp, mmap.mmap(fp.fileno(),0,access=mmap.ACCESS_READ) as mm:
+        return scan_step_lines(np.frombuffer(mm,dtype=np.uint8,count=stop-start,offset=start))
 
 ############################################################################################################
 # Classes
 ############################################################################################################
 
+class FLASHLogRecords():
+    def __init__(self,fields,capacity=64):
+        # struct-of-arrays storage, i.e., one numpy array (column) for each field,
+        # which is grown by doubling the capacity when it is full
+        self.n_records = 0
+        self.capacity = capacity
+        self.columns = {field: np.empty(capacity,dtype=dtype) for field, dtype in fields.items()}
+
+    def __len__(self):
+        return self.n_records
+
+    def filled_columns(self):
+        # the filled part of all of the columns, in one go
+        return {field: column[:self.n_records] for field, column in self.columns.items()}
+
+    def append(self,**record):
+        if self.n_records == self.capacity:
+            self.capacity *= 2
+            for field, column in self.columns.items():
+                self.columns[field] = np.empty(self.capacity,dtype=column.dtype)
+                self.columns[field][:self.n_records] = column
+        for field, value in record.items():
+            self.columns[field][self.n_records] = value
+        self.n_records += 1
+
 class FLASHLogFileIO():
     def __init__(self,write_id):
         self.start_date = ""
@@ -106,25 +340,10 @@ class FLASHLogFileIO():
         if self.open:
             self.open = False
 
-class FLASHLogBlock():
-    def __init__(self,block_id):
-        self.block_id = block_id
-        self.core_hours = 0
-        self.wall_time = 0
-        self.avg_wall_time_diff = 0
-        self.std_wall_time_diff = 0
-        self.avg_wall_time_diff_norm = 0
-        self.std_wall_time_diff_norm = 0
-        self.dt = 0
-        self.start_date = ""
-        self.end_date = ""
-        self.start_line = 0
-        self.end_line = 0
-        self.n_steps = 0
-
 class FLASHLogStats:
-    def __init__(self,file_path,debug=False,site="superMUC-NG"):
+    def __init__(self,file_path,debug=False,site="superMUC-NG",n_workers=1):
         self.turb_log_file_path = file_path
+        self.n_workers = n_workers
         self.site = site
         self.total_core_hours = 0
         if site == "superMUC-NG" or site == "Gadi":
@@ -136,126 +355,199 @@ class FLASHLogStats:
         self.nzb = None
         self.n_cells_per_block = None
         self.n_cells = None
-        self.blocks = {}
-        self.fileIOs = {}
+        self.params_found = False
+        self.blocks = FLASHLogRecords({"block_id"             : "i8",
+                                       "core_hours"           : "f8",
+                                       "n_steps"              : "i8",
+                                       "avg_wall_time_diff"   : "f8",
+                                       "std_wall_time_diff"   : "f8",
+                                       "avg_wall_time_norm"   : "f8",
+                                       "std_wall_time_norm"   : "f8",
+                                       "start_date"           : "datetime64[us]",
+                                       "end_date"             : "datetime64[us]",
+                                       "start_line"           : "i8",
+                                       "end_line"             : "i8"})
+        self.fileIOs = FLASHLogRecords({"write_id"            : "i8",
+                                        "file_type"           : "U3",
+                                        "core_hours"          : "f8",
+                                        "wall_time"           : "f8",
+                                        "wall_time_norm"      : "f8",
+                                        "start_date"          : "datetime64[us]"})
         self.debug = debug
 
     def search_core_count(self,line_number,line):
-        search_obj = re.search(r"Number of MPI tasks:",line)
+        if b"MPI tasks:" not in line:
+            return
+        search_obj = _CORES_RE.search(line)
         if search_obj:
-            match_obj = re.findall(r"\d+",line)
-            self.n_cores = int(match_obj[0])
+            self.n_cores = int(search_obj.group(1))
             self.nodes = self.n_cores / self.n_cores_per_node
 
-    def search_block_cell_count(self,line_number,line,block_string):
-        search_obj = re.search(block_string,line)
+    def search_block_cell_count(self,line_number,line,block_re):
+        if b"zones:" not in line:
+            return
+        search_obj = block_re.search(line)
         if search_obj:
-            match_obj = re.findall(r"\d+",line)
-            block_cell_count = int(match_obj[0])
+            block_cell_count = int(search_obj.group(1))
             return(block_cell_count)
 
     def search_walltime(self,line):
-        # if the line contains a time step (n)
-        search_obj = re.search(f"n=\d+",line)
+        # cheap check before running the regex, most lines do not contain a step
+        if b"n=" not in line:
+            return None, None
+        # if the line contains a time step (n), extract the date, wall-time
+        # (H:M:S format) and dt in a single pass over the line
+        search_obj = _STEP_LINE_RE.match(line)
         if search_obj: # if there is a code step in the line
-            # extract the wall-time in H:M:S format
-            wall_time_obj = re.findall(r"\d+\:\d+\:\d+\.\d+",line)
-            date_obj = re.findall(r"\d+-\d+-\d+",line)
-            #date = datetime.date(date_obj[0])
-            wall_time = datetime.strptime(date_obj[0]+ " " + wall_time_obj[0], '%m-%d-%Y %H:%M:%S.%f')
-            # extract the dt
-            dt_obj = re.findall(r"dt=\d+.\d+\D+\d+",line)
-            dt=float(dt_obj[0].split("=")[1])
+            # store the wall-time as an integer number of microseconds so that
+            # the block statistics can be accumulated with integer arithmetic
+            wall_time = self.extract_timestamp(line,search_obj)
+            dt = float(search_obj.group(3))
             if self.debug:
-                print(f"search_walltime: time={wall_time}, dt={dt}")
+                print(f"search_walltime: time={np.datetime64(wall_time,'us')}, dt={dt}")
             return wall_time, dt
         else:  # if there is no code step, return none
             return None, None
 
+    def extract_timestamp(self,line,search_obj=None):
+        # the timestamp of a line, in microseconds since the epoch. A match that
+        # has already been made on the line (with the date and time as its first
+        # two groups, e.g., from _STEP_LINE_RE) is reused rather than searched again
+        if search_obj is None:
+            search_obj = _WALLTIME_RE.match(line)
+            if search_obj is None:
+                return None
+        return self.parse_timestamp(*search_obj.group(1,2))
+
+    def parse_timestamp(self,date_str,time_str):
+        # convert the MM-DD-YYYY date and HH:MM:SS.fff time into microseconds since
+        # the (unix) epoch with integer arithmetic, rather than datetime.strptime,
+        # which re-interprets the format string on every call
+        month, day, year = date_str.split(b"-")
+        hms, frac = time_str.split(b".")
+        hours, minutes, secs = hms.split(b":")
+        days = date(int(year),int(month),int(day)).toordinal() - epoch_ordinal
+        micro_secs = ((days*24 + int(hours))*60 + int(minutes))*60 + int(secs)
+        return micro_secs*1000000 + int(frac.ljust(6,b"0")[:6])
+
     def search_file_write_stats(self,line,fileIO,IO_id_counter):
-        # Extract the time and date and wall time
-        wall_time_obj = re.findall(r"\d+\:\d+\:\d+\.\d+",line)
-        date_obj = re.findall(r"\d+-\d+-\d+",line)
-        wall_time = datetime.strptime(date_obj[0]+ " " + wall_time_obj[0], '%m-%d-%Y %H:%M:%S.%f')
-        if re.search(f"open:",line):
+        # the time and date are only extracted on the lines that open or close a file
+        if b"open:" in line:
+            wall_time = self.extract_timestamp(line)
             if fileIO.open:
                 fileIO.empty()
             if self.debug:
                 print("search_file_write_stats: found an open file")
             fileIO.open_file()
-            fileIO.start_date = wall_time
+            fileIO.start_date = np.datetime64(wall_time,"us")
             fileIO.wall_time = wall_time
             if self.debug:
                 print(wall_time - fileIO.wall_time)
-        elif re.search(f"close:",line):
+        elif b"close:" in line:
+            wall_time = self.extract_timestamp(line)
             if self.debug:
                 print("search_file_write_stats: closing file")
             fileIO.close_file()
-            fileIO.wall_time = wall_time - fileIO.wall_time
-            fileIO.wall_time = fileIO.wall_time.total_seconds()
+            fileIO.wall_time = (wall_time - fileIO.wall_time) * 1e-6
             if self.debug:
-                print(f"search_file_write_stats: {wall_time - fileIO.wall_time}")
+                print(f"search_file_write_stats: {fileIO.wall_time}")
             fileIO.core_hours = fileIO.wall_time / seconds_per_hour
 
+    def search_sim_parameters(self,line_number,line):
+        # get the number of cores
+        if self.n_cores is None:
+            self.search_core_count(line_number,line)
+        if self.nxb is None:
+            self.nxb = self.search_block_cell_count(line_number,line,_NX_RE)
+        if self.nyb is None:
+            self.nyb = self.search_block_cell_count(line_number,line,_NY_RE)
+        if self.nzb is None:
+            self.nzb = self.search_block_cell_count(line_number,line,_NZ_RE)
+        # once all of the parameters are found, stop searching for them
+        if None not in (self.n_cores,self.nxb,self.nyb,self.nzb):
+            self.compute_sim_parameters()
+            self.params_found = True
+
     def compute_sim_parameters(self):
         if self.debug:
-            print("compute_sim_parameters: first pass through the file to read sim. parameters.")
-        with open(self.turb_log_file_path) as fp:
-            line = fp.readline()
-            cnt = 1
-            while line:
-                # get the number of cores
-                if self.n_cores is None:
-                    self.search_core_count(cnt,line)
-                if self.nxb is None:
-                    self.nxb = self.search_block_cell_count(cnt,line,"Number x zones:")
-                if self.nyb is None:
-                    self.nyb = self.search_block_cell_count(cnt,line,"Number y zones:")
-                if self.nzb is None:
-                    self.nzb = self.search_block_cell_count(cnt,line,"Number z zones:")
-                line = fp.readline()
-                cnt += 1
-
+            print("compute_sim_parameters: computing sim. parameters from the header of the log file.")
         self.n_cells_per_block = self.nxb * self.nyb * self.nzb
         self.n_cells = self.n_cells_per_block * self.n_cores
 
-    def process_block_statistics(self,block,wall_time_list,cnt,dt_list,block_id_counter):
-        # initilise a list for storing the steps in seconds
-        steps_per_time_secs = []
+    def compute_step_statistics(self,n_diffs,sum_diff,sum_diff_sq):
+        # mean and standard deviation of the time between steps, from the running
+        # (integer microsecond) sums accumulated over a block, in seconds
+        if n_diffs == 0:
+            return np.nan, np.nan
+        avg_wall_time_diff = sum_diff / n_diffs * 1e-6
+        std_wall_time_diff = math.sqrt((n_diffs*sum_diff_sq - sum_diff*sum_diff) / n_diffs**2) * 1e-6
+        return avg_wall_time_diff, std_wall_time_diff
+
+    def process_block_statistics(self,start_date,start_line,end_date,cnt,avg_wall_time_diff,std_wall_time_diff,block_id_counter):
         # now process all of the statistics for a single block
-        block.end_date = wall_time_list[-1]
-        block.end_line = cnt-1
-        block.n_steps = block.end_line - block.start_line
-        block.wall_time = wall_time_list
-        block.dt = dt_list
-
-        # time between steps
-        steps_per_time = np.diff(block.wall_time)
-
-        # slow loop (can't find a way to do this better with time.delta objects)
-        # to convert time.delta objects into total seconds
-        for idx, _ in enumerate(steps_per_time):
-            steps_per_time_secs.append(steps_per_time[idx].total_seconds())
-
-        # add to block attributes
-        block.core_hours = (block.end_date - block.start_date) * self.n_cores
-        block.avg_wall_time_diff = np.mean(steps_per_time_secs)
-        block.std_wall_time_diff = np.std(steps_per_time_secs)
-        block.avg_wall_time_norm = block.avg_wall_time_diff / self.n_cells_per_block
-        block.std_wall_time_norm = block.std_wall_time_diff / self.n_cells_per_block
+        end_line = cnt-1
 
         # add the block to the FLASH class
-        self.blocks[block_id_counter] = block
-
-    def rename_and_transpose(self,data_frame):
-        return data_frame.T.rename(columns={0:"entry_type",
-                                            1:"id",
-                                            2:"core_hrs",
-                                            3:"n_steps",
-                                            4:"avg_wall_time_per_step (s)",
-                                            5:"avg_wall_time_norm (s)", # change this to normalised to wall time normalised
-                                            6:"std_wall_time_norm (s)",
-                                            7:"start_date"})
+        self.blocks.append(block_id             = block_id_counter,
+                           core_hours           = (end_date - start_date) * 1e-6 / seconds_per_hour * self.n_cores,
+                           n_steps              = end_line - start_line,
+                           avg_wall_time_diff   = avg_wall_time_diff,
+                           std_wall_time_diff   = std_wall_time_diff,
+                           avg_wall_time_norm   = avg_wall_time_diff / self.n_cells_per_block,
+                           std_wall_time_norm   = std_wall_time_diff / self.n_cells_per_block,
+                           start_date           = np.datetime64(start_date,"us"),
+                           end_date             = np.datetime64(end_date,"us"),
+                           start_line           = start_line,
+                           end_line             = end_line)
+
+    def search_steps(self,mm):
+        # large files are split into chunks (at line boundaries) that are scanned
+        # in parallel, and the steps from each chunk are joined back together
+        n_chunks = min(self.n_workers,len(mm) // min_chunk_bytes)
+        if n_chunks <= 1:
+            return scan_step_lines(np.frombuffer(mm,dtype=np.uint8))
+        if self.debug:
+            print(f"search_steps: scanning the file in {n_chunks} chunks.")
+        chunk_size = len(mm) // n_chunks
+        cuts = [0]
+        for chunk in range(1,n_chunks):
+            cut = mm.find(b"\n",chunk*chunk_size) + 1
+            cuts.append(cut if cut > 0 else len(mm))
+        cuts.append(len(mm))
+        with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+            chunks = list(executor.map(scan_log_chunk,repeat(self.turb_log_file_path),cuts[:-1],cuts[1:]))
+
+        # offset the line numbers in each chunk by the number of lines in the chunks before it
+        chunk_n_lines = [n_lines for _, _, n_lines in chunks]
+        line_offsets = np.cumsum([0] + chunk_n_lines[:-1])
+        step_lines = np.concatenate([step_lines + offset for (step_lines, _, _), offset in zip(chunks,line_offsets)])
+        step_times = np.concatenate([step_times for _, step_times, _ in chunks])
+        return step_lines, step_times, sum(chunk_n_lines)
+
+    def process_step_arrays(self,step_lines,step_times,n_lines):
+        if len(step_lines) == 0:
+            return
+        # blocks are runs of steps on consecutive lines of the log file
+        block_starts = np.concatenate(([0],np.flatnonzero(np.diff(step_lines) != 1) + 1))
+        block_ends = np.append(block_starts[1:],len(step_lines))
+        # a block is only closed by a line that is not a step, so (as in the line
+        # by line search) a block that runs to the end of the file is not included
+        if step_lines[-1] == n_lines:
+            block_starts = block_starts[:-1]
+            block_ends = block_ends[:-1]
+
+        step_diffs = np.diff(step_times)
+        for block_id_counter, (start, end) in enumerate(zip(block_starts,block_ends)):
+            # mean and standard deviation of the time between steps, in seconds
+            diffs = step_diffs[start:end-1]
+            if len(diffs) > 0:
+                avg_wall_time_diff = diffs.mean() * 1e-6
+                std_wall_time_diff = diffs.std() * 1e-6
+            else:
+                avg_wall_time_diff = std_wall_time_diff = np.nan
+            self.process_block_statistics(int(step_times[start]),int(step_lines[start]),int(step_times[end-1]),
+                                          int(step_lines[end-1])+1,avg_wall_time_diff,std_wall_time_diff,
+                                          block_id_counter)
 
     def deconstruct_log_file(self):
         # local variables
@@ -264,137 +556,202 @@ class FLASHLogStats:
         write = False
         IO_id_counter = 0
         block_id_counter = 0
-        wall_time_list = []
-        dt_list = []
-
-        # Make sure the simulation parameter objects are populated
-        if self.n_cells is None:
-            self.compute_sim_parameters()
-
-        with open(self.turb_log_file_path) as fp: # with the log file open
-            line = fp.readline()
-            cnt = 1
-            while line: # while there is a line to be read
-
-                if args["file_writes"]:
-                    if self.debug:
+        last_wall_time = None
+        n_diffs = 0
+        sum_diff = 0
+        sum_diff_sq = 0
+
+        # memory map the file (rather than reading it all into memory), so that the
+        # operating system pages it in as it is scanned
+        with open(self.turb_log_file_path,"rb") as fp, \
+             mmap.mmap(fp.fileno(),0,access=mmap.ACCESS_READ) as mm: # with the log file open
+
+            # with numba, the step lines are found with a compiled scan over the raw
+            # bytes, rather than with the line by line (regex) search below
+            jit_blocks = args["blocks"] and numba_available
+            if jit_blocks:
+                if self.debug:
+                    print("deconstruct_log_file: scanning for steps with numba.")
+                step_lines, step_times, n_lines = self.search_steps(mm)
+
+            # bind the options and methods used on every line to local names, so that
+            # they are not looked up (in args / self) for each line
+            debug = self.debug
+            file_writes = args["file_writes"]
+            line_blocks = args["blocks"] and not jit_blocks
+            search_walltime = self.search_walltime
+            search_file_write_stats = self.search_file_write_stats
+
+            for cnt, line in enumerate(iter(mm.readline,b""),1): # for each line in the file
+
+                # the simulation parameters are in the header of the log file, so
+                # they are read in the same pass as the blocks and file I/O events
+                if not self.params_found:
+                    self.search_sim_parameters(cnt,line)
+                elif jit_blocks and not file_writes:
+                    # nothing else to search for line by line
+                    break
+
+                if file_writes:
+                    if debug:
                         print("deconstruct_log_file: starting to initialise fileIO decomp.")
                     # search the line for check point of write plot files
-                    search_chk = re.search("IO_writeCheckpoint",line)
-                    search_plt = re.search("IO_writePlotfile",line)
+                    if b"IO_write" in line:
+                        search_chk = b"IO_writeCheckpoint" in line
+                        search_plt = b"IO_writePlotfile" in line
+                    else:
+                        search_chk = search_plt = False
 
                     # add the number of files IOs
                     # initialise a file
-                    if search_chk is not None or search_plt is not None:
+                    if search_chk or search_plt:
                         if write:
-                            self.search_file_write_stats(line,fileIO,IO_id_counter)
+                            search_file_write_stats(line,fileIO,IO_id_counter)
                             if fileIO.close:
-                                if search_chk is not None:
+                                if search_chk:
                                     fileIO.file_type = "chk"
-                                elif search_plt is not None:
+                                elif search_plt:
                                     fileIO.file_type = "plt"
                                 fileIO.wall_time_norm = fileIO.wall_time / self.n_cells_per_block
                                 write = False
-                                self.fileIOs[IO_id_counter] = fileIO
+                                self.fileIOs.append(write_id        = fileIO.write_id,
+                                                    file_type       = fileIO.file_type,
+                                                    core_hours      = fileIO.core_hours,
+                                                    wall_time       = fileIO.wall_time,
+                                                    wall_time_norm  = fileIO.wall_time_norm,
+                                                    start_date      = fileIO.start_date)
                                 IO_id_counter += 1
                         else:
                             write = True
                             fileIO = FLASHLogFileIO(IO_id_counter)
-                            self.search_file_write_stats(line,fileIO,IO_id_counter)
-                        if self.debug:
-                            print(self.fileIOs)
+                            search_file_write_stats(line,fileIO,IO_id_counter)
+                        if debug:
+                            print(f"deconstruct_log_file: {len(self.fileIOs)} file I/O events")
 
-                if args["blocks"]:
-                    if self.debug:
+                if line_blocks:
+                    if debug:
                         print("deconstruct_log_file: starting to initialise block decomp.")
-                    # search the line for the wall time
-                    wall_time, dt = self.search_walltime(line)
+                    # search the line for the wall time, if it is timestamped. FLASH writes
+                    # these as " [ MM-DD-YYYY  HH:MM:SS.fff ] ...", so the dashes of the date
+                    # are at fixed columns, which is much cheaper to check than any regex
+                    if line[5:6] == b"-" and line[8:9] == b"-":
+                        wall_time, dt = search_walltime(line)
+                    else:
+                        wall_time = None
 
                     # if there is a wall time in the search, i.e.,
                     # if we are inside of a chunk (or block) of time integrations
                     if wall_time is not None:
                         # if this is the first wall time in a chunk
                         if not chunk:
-                            block = FLASHLogBlock(block_id_counter)
-                            block.start_date = wall_time
-                            block.start_line = cnt
+                            start_date = wall_time
+                            start_line = cnt
                             chunk = True
-
-                        # if the are inside of a block, then store the wall_time
-                        # and dt
-                        wall_time_list.append(wall_time)
-                        dt_list.append(dt)
+                        else:
+                            # if the are inside of a block, then update the running
+                            # sums of the time between steps
+                            diff = wall_time - last_wall_time
+                            n_diffs += 1
+                            sum_diff += diff
+                            sum_diff_sq += diff*diff
+                        last_wall_time = wall_time
 
                     else: # if there is no wall time data
                         # if there is no wall time data AND we just finished a chunk
                         if chunk:
-                            if self.debug:
+                            if debug:
                                 print("deconstruct_log_file: entered a chunk")
 
                             # update all of the statistics of a block
-                            self.process_block_statistics(block,wall_time_list,cnt,dt_list,block_id_counter)
+                            avg_wall_time_diff, std_wall_time_diff = self.compute_step_statistics(n_diffs,sum_diff,sum_diff_sq)
+                            self.process_block_statistics(start_date,start_line,last_wall_time,cnt,
+                                                          avg_wall_time_diff,std_wall_time_diff,block_id_counter)
 
-                            # update / empty the counters / lists
+                            # update / empty the counters / running sums
                             block_id_counter += 1
-                            wall_time_list = []
-                            dt_list = []
+                            n_diffs = 0
+                            sum_diff = 0
+                            sum_diff_sq = 0
                             chunk = False
 
                 wall_time = None
-                line = fp.readline()
-                cnt += 1
+
+        if jit_blocks:
+            self.process_step_arrays(step_lines,step_times,n_lines)
+
+    def format_dates(self,dates):
+        # format datetime64[us] dates as MM-DD-YYYY HH:MM:SS.ffffff strings, for the
+        # whole array at once: numpy formats them as YYYY-MM-DDTHH:MM:SS.ffffff, and the
+        # characters are then reordered as a (n_dates, 26) array of bytes
+        iso_chars = np.datetime_as_string(dates,unit="us").astype("S26").view(np.uint8).reshape(-1,26)
+        order = [5,6,7,8,9,4,0,1,2,3,10] + list(range(11,26))
+        chars = np.ascontiguousarray(iso_chars[:,order])
+        chars[:,10] = ord(" ")
+        return chars.view("S26").ravel().astype(str)
 
     def create_dataset(self):
         if self.debug:
             print("create_block_dataset: creating the dataset")
+        # each dataset is built in one go from the (struct-of-arrays) columns
         if args["blocks"]:
-            number_of_blocks = len(self.blocks.keys())
-            entry_type = np.repeat("block",number_of_blocks)
-            block_data_frame = pd.concat(
-                            [pd.DataFrame(
-                            [entry_type[key],
-                             self.blocks[key].block_id,
-                             self.blocks[key].core_hours.total_seconds()/seconds_per_hour,
-                             self.blocks[key].n_steps,
-                             self.blocks[key].avg_wall_time_diff,
-                             self.blocks[key].avg_wall_time_norm,
-                             self.blocks[key].std_wall_time_norm,
-                             self.blocks[key].start_date.strftime("%m-%d-%Y %H:%M:%S.%f")]) for key in self.blocks.keys()],
-                            ignore_index=True,axis=1)
-            block_data_frame = self.rename_and_transpose(block_data_frame)
+            blocks = self.blocks.filled_columns()
+            block_data_frame = pd.DataFrame(
+                            {"entry_type"                   : "block",
+                             "id"                           : blocks["block_id"],
+                             "core_hrs"                     : blocks["core_hours"],
+                             "n_steps"                      : blocks["n_steps"],
+                             "avg_wall_time_per_step (s)"   : blocks["avg_wall_time_diff"],
+                             "avg_wall_time_norm (s)"       : blocks["avg_wall_time_norm"], # change this to normalised to wall time normalised
+                             "std_wall_time_norm (s)"       : blocks["std_wall_time_norm"],
+                             "start_date"                   : self.format_dates(blocks["start_date"])})
             if not args["file_writes"]:
                 block_data_frame.to_csv(f"{self.turb_log_file_path.split('.')[0]}_block_data.csv")
 
         if args["file_writes"]:
-            number_of_fileIOs = len(self.fileIOs.keys())
-            entry_type = np.repeat("fileIO",number_of_fileIOs)
-            zero_fill  = np.zeros(number_of_fileIOs)
-            fileIO_data_frame = pd.concat(
-                            [pd.DataFrame(
-                            [entry_type[key],
-                             self.fileIOs[key].file_type,
-                             self.fileIOs[key].core_hours,
-                             zero_fill[key],
-                             self.fileIOs[key].wall_time,
-                             self.fileIOs[key].wall_time_norm,
-                             zero_fill[key],
-                             self.fileIOs[key].start_date.strftime("%m-%d-%Y %H:%M:%S.%f")]) for key in self.fileIOs.keys()],
-                            ignore_index=True,axis=1)
-            fileIO_data_frame = self.rename_and_transpose(fileIO_data_frame)
+            fileIOs = self.fileIOs.filled_columns()
+            zero_fill = np.zeros(len(self.fileIOs))
+            fileIO_data_frame = pd.DataFrame(
+                            {"entry_type"                   : "fileIO",
+                             "id"                           : fileIOs["file_type"],
+                             "core_hrs"                     : fileIOs["core_hours"],
+                             "n_steps"                      : zero_fill,
+                             "avg_wall_time_per_step (s)"   : fileIOs["wall_time"],
+                             "avg_wall_time_norm (s)"       : fileIOs["wall_time_norm"],
+                             "std_wall_time_norm (s)"       : zero_fill,
+                             "start_date"                   : self.format_dates(fileIOs["start_date"])})
             if not args["blocks"]:
                 fileIO_data_frame.to_csv(f"{self.turb_log_file_path.split('.')[0]}_fileIO_data.csv")
 
         if args["file_writes"] and args["blocks"]:
+            # keep the block n_steps as integers (rather than upcasting them to the
+            # float zeros of the file I/O events) in the combined dataset
+            block_data_frame = block_data_frame.astype({"n_steps": object})
             data_frame = pd.concat([block_data_frame,fileIO_data_frame])
             data_frame.to_csv(f"{self.turb_log_file_path.split('.')[0]}_log_data.csv")
 
+def available_cores():
+    # the cores this job may run on (which the batch system may restrict to fewer
+    # than the cores on the node), falling back to the cores on the node where the
+    # affinity is not available (e.g., macOS and Windows)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def process_log_file(file,n_workers=1):
+    print(f"Beginning on file: {file}")
+    turb_log = FLASHLogStats(file,args["debug"],n_workers=n_workers)
+    turb_log.deconstruct_log_file()
+    turb_log.create_dataset()
+
 def main():
-    for file in args["file"]:
-        print(f"Beginning on file: {file}")
-        turb_log = FLASHLogStats(file,args["debug"])
-        turb_log.compute_sim_parameters()
-        turb_log.deconstruct_log_file()
-        turb_log.create_dataset()
+    # each log file is independent, so process them in parallel
+    if len(args["file"]) > 1:
+        with ProcessPoolExecutor(max_workers=min(available_cores(),len(args["file"]))) as executor:
+            list(executor.map(process_log_file,args["file"]))
+    else:
+        # a single (large) log file is split between the cores instead
+        process_log_file(args["file"][0],n_workers=available_cores())
 
 ############################################################################################################
 # Main